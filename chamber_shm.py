@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Shared-memory "latest state" segment for local readers.
+
+The web host publishes every parsed reading into a named
+multiprocessing.shared_memory segment. Any other process on the machine
+(scripts, exporters, the uploader) can map it and read the current state
+without going through HTTP or the serial port:
+
+    from chamber_shm import StateReader
+    reader = StateReader()
+    print(reader.latest())        # newest reading for chamber 0
+    print(reader.history(0, 10))  # last 10 readings, oldest first
+
+Layout (all little-endian):
+
+    header:  magic, layout version, chambers, history length, record size,
+             generation (random per segment)
+    per chamber slot:
+        seq    u32   seqlock counter, odd while the writer is mid-update
+        count  u32   total records written (history head = count % history)
+        latest record
+        history ring of records
+
+A reader copies a slot, then checks that seq was even and unchanged across
+the copy; otherwise it retries. This assumes one writer per chamber slot.
+Python has no memory barriers, so on weakly ordered CPUs (ARM, including the
+Raspberry Pi) another core can see the writer's stores out of order, and a
+torn record can occasionally pass the seq check. Readers on such hosts get
+best-effort consistency, not a guarantee.
+
+Several host processes can share one segment, one chamber slot each: a
+publisher attaches to an existing segment whose header matches its layout
+and only replaces one that does not. On POSIX the segment outlives the
+publishers so no host can pull it out from under another. When a segment is
+replaced, the old one is marked retired first; readers notice on their next
+read and re-open the name, and publishers re-attach if the new layout
+matches theirs or stop publishing with a message if it does not. A host
+that simply stopped leaves its last reading in place, so readers that care
+about liveness should check each record's TIME.
+Requires Python 3.8+.
+"""
+import os
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+DEFAULT_NAME = os.environ.get('CHAMBER_SHM', 'cloudchamber')
+DEFAULT_HISTORY = 256
+
+MAGIC = 0x4D534343  # 'CCSM'
+LAYOUT_VERSION = 2
+HEADER = struct.Struct('<IHHIIQ')
+SLOT_HEADER = struct.Struct('<II')
+# time, hot, mid, cold, air_t, air_h, light, ds18_count, flags
+RECORD = struct.Struct('<dfffffiBB2x')
+FIELDS = ('TIME', 'HOT', 'MID', 'COLD', 'AIR_T', 'AIR_H', 'LIGHT',
+          'DS18COUNT', 'FLAGS')
+
+FLAG_RELAY_HOT = 0x01
+FLAG_RELAY_COLD = 0x02
+
+NAN = float('nan')
+
+# How long to wait for another host to finish initialising a new segment.
+INIT_TIMEOUT = 1.0
+
+
+def slot_size(history):
+    return SLOT_HEADER.size + RECORD.size * (history + 1)
+
+
+def segment_size(chambers, history):
+    return HEADER.size + chambers * slot_size(history)
+
+
+def open_segment(name, create=False, size=0):
+    """Map a segment without letting this process's exit unlink it."""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, create=create, size=size,
+                                          track=False)
+    shm = shared_memory.SharedMemory(name, create=create, size=size)
+    if os.name == 'posix':
+        # Older Pythons register every mapping with the resource tracker,
+        # which unlinks it at exit, even for segments others still use.
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def unlink_segment(shm):
+    """Unlink a segment mapped with open_segment()."""
+    if sys.version_info < (3, 13) and os.name == 'posix':
+        # unlink() unregisters from the tracker; undo open_segment() first.
+        from multiprocessing import resource_tracker
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def read_header(buf):
+    """(magic, version, chambers, history, record size, generation)."""
+    return HEADER.unpack_from(buf, 0)
+
+
+def map_segment(name):
+    """Open a segment and return (shm, header); ValueError if not ours."""
+    shm = open_segment(name)
+    header = read_header(shm.buf) if len(shm.buf) >= HEADER.size else None
+    if header is None or header[0] != MAGIC or header[1] != LAYOUT_VERSION \
+            or header[4] != RECORD.size:
+        shm.close()
+        raise ValueError(f'{name} is not a cloudchamber state segment')
+    return shm, header
+
+
+def to_float(value):
+    # Readings arrive as strings from the serial parsers ("NaN", "--", ...)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+def to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def pack_readings(readings, timestamp):
+    flags = 0
+    if str(readings.get('RHOT', '')).upper() == 'ON':
+        flags |= FLAG_RELAY_HOT
+    if str(readings.get('RCOLD', '')).upper() == 'ON':
+        flags |= FLAG_RELAY_COLD
+    return RECORD.pack(
+        timestamp,
+        to_float(readings.get('HOT')),
+        to_float(readings.get('MID')),
+        to_float(readings.get('COLD')),
+        to_float(readings.get('AIR_T')),
+        to_float(readings.get('AIR_H')),
+        to_int(readings.get('LIGHT')),
+        to_int(readings.get('DS18COUNT')) & 0xFF,
+        flags,
+    )
+
+
+def unpack_record(buf, offset):
+    record = dict(zip(FIELDS, RECORD.unpack_from(buf, offset)))
+    flags = record.pop('FLAGS')
+    record['RHOT'] = 'ON' if flags & FLAG_RELAY_HOT else 'OFF'
+    record['RCOLD'] = 'ON' if flags & FLAG_RELAY_COLD else 'OFF'
+    return record
+
+
+class StatePublisher:
+    """Writer side for one or more chamber slots of a shared segment."""
+
+    def __init__(self, name=DEFAULT_NAME, chambers=1, history=DEFAULT_HISTORY):
+        self.name = name
+        self.chambers = chambers
+        self.history_len = history
+        self.shm = None
+        self._attach(replace=True)
+
+    def _attach(self, replace):
+        """Map a segment with our layout, creating it if needed.
+
+        An existing segment with another layout is retired and replaced when
+        `replace` is set; otherwise this returns False and leaves it alone.
+        """
+        size = segment_size(self.chambers, self.history_len)
+        ours = (MAGIC, LAYOUT_VERSION, self.chambers, self.history_len,
+                RECORD.size)
+        deadline = time.monotonic() + INIT_TIMEOUT
+        while True:
+            try:
+                shm = open_segment(self.name, create=True, size=size)
+                self._init_segment(shm, size)
+                break
+            except FileExistsError:
+                pass
+            try:
+                shm = open_segment(self.name)
+            except (FileNotFoundError, ValueError):
+                # Unlinked in the meantime, or not sized yet by its creator.
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.01)
+                continue
+            layout = None
+            if len(shm.buf) >= HEADER.size:
+                layout = read_header(shm.buf)[:5]
+            if layout == ours:
+                break
+            if (layout is None or layout[0] == 0) and time.monotonic() < deadline:
+                # Zero magic: another host is still initialising it, or it
+                # was just retired and is about to be unlinked.
+                shm.close()
+                time.sleep(0.01)
+                continue
+            if not replace:
+                shm.close()
+                return False
+            # Different layout: retire it so attached readers and publishers
+            # move on, then replace it with ours.
+            if layout is not None:
+                struct.pack_into('<I', shm.buf, 0, 0)
+            shm.close()
+            try:
+                unlink_segment(shm)
+            except FileNotFoundError:
+                pass
+        self.shm = shm
+        self.buf = shm.buf
+        self.generation = read_header(self.buf)[5]
+        # Carry on from the counts already in the segment so history written
+        # by an earlier host on this slot stays in order.
+        self.counts = [
+            SLOT_HEADER.unpack_from(
+                self.buf, HEADER.size + i * slot_size(self.history_len))[1]
+            for i in range(self.chambers)
+        ]
+        return True
+
+    def _check_generation(self):
+        """Follow a replaced segment; False if we can no longer publish."""
+        magic, _, _, _, _, generation = read_header(self.buf)
+        if magic == MAGIC and generation == self.generation:
+            return True
+        self.close()
+        if self._attach(replace=False):
+            return True
+        print(f'[DEBUG] shared memory {self.name} was replaced by a host with '
+              f'a different layout; no longer publishing')
+        return False
+
+    def _init_segment(self, shm, size):
+        buf = shm.buf
+        buf[:size] = bytes(size)
+        generation = int.from_bytes(os.urandom(8), 'little')
+        HEADER.pack_into(buf, 0, MAGIC, LAYOUT_VERSION, self.chambers,
+                         self.history_len, RECORD.size, generation)
+
+    def publish(self, readings, slot=0, timestamp=None):
+        """Store a readings dict as the latest state and append it to history.
+
+        Returns False, without writing, once the segment has been taken over
+        by a host with a different layout.
+        """
+        if not 0 <= slot < self.chambers:
+            raise IndexError(f'chamber slot {slot} out of range')
+        if self.shm is None or not self._check_generation():
+            return False
+        record = pack_readings(readings, time.time() if timestamp is None else timestamp)
+        base = HEADER.size + slot * slot_size(self.history_len)
+        seq = SLOT_HEADER.unpack_from(self.buf, base)[0]
+        if seq & 1:
+            # An earlier host died mid-update; start from a settled state.
+            seq += 1
+        count = self.counts[slot]
+        # Odd seq marks the slot as mid-update for readers.
+        SLOT_HEADER.pack_into(self.buf, base, (seq + 1) & 0xFFFFFFFF, count)
+        latest = base + SLOT_HEADER.size
+        self.buf[latest:latest + RECORD.size] = record
+        ring = latest + RECORD.size * (1 + count % self.history_len)
+        self.buf[ring:ring + RECORD.size] = record
+        self.counts[slot] = count + 1
+        SLOT_HEADER.pack_into(self.buf, base, (seq + 2) & 0xFFFFFFFF, count + 1)
+        return True
+
+    def close(self):
+        """Unmap the segment; it stays in place for other hosts and readers."""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+
+class StateReader:
+    """Reader side; maps an existing segment read-only by convention."""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self._use(*map_segment(name))
+
+    def _use(self, shm, header):
+        self.shm = shm
+        self.buf = shm.buf
+        _, _, self.chambers, self.history_len, _, self.generation = header
+
+    def _check_generation(self):
+        # A publisher with a different layout retires the segment (zeroed
+        # magic) before replacing it; follow it to the new one. The old
+        # mapping is only dropped once the new one opened, so a reader that
+        # hits the gap while the new segment is being created just retries.
+        magic, _, _, _, _, generation = read_header(self.buf)
+        if magic == MAGIC and generation == self.generation:
+            return
+        shm, header = map_segment(self.name)
+        old = self.shm
+        self._use(shm, header)
+        old.close()
+
+    def _snapshot(self, slot, length, retries=1000):
+        """Consistent copy of the first `length` bytes of a chamber slot."""
+        self._check_generation()
+        if not 0 <= slot < self.chambers:
+            raise IndexError(f'chamber slot {slot} out of range')
+        base = HEADER.size + slot * slot_size(self.history_len)
+        end = base + length
+        for _ in range(retries):
+            seq = SLOT_HEADER.unpack_from(self.buf, base)[0]
+            if seq & 1:
+                continue
+            data = bytes(self.buf[base:end])
+            if SLOT_HEADER.unpack_from(self.buf, base)[0] == seq:
+                return data
+        raise TimeoutError('writer kept the slot busy; try again')
+
+    def latest(self, slot=0):
+        """Newest reading for a chamber, or None if nothing was published yet.
+
+        The reading may be old if its host has stopped; compare TIME with
+        time.time() to tell.
+        """
+        data = self._snapshot(slot, SLOT_HEADER.size + RECORD.size)
+        count = SLOT_HEADER.unpack_from(data, 0)[1]
+        if count == 0:
+            return None
+        return unpack_record(data, SLOT_HEADER.size)
+
+    def history(self, slot=0, limit=None):
+        """Up to `limit` recent readings for a chamber, oldest first."""
+        data = self._snapshot(slot, slot_size(self.history_len))
+        count = SLOT_HEADER.unpack_from(data, 0)[1]
+        n = min(count, self.history_len)
+        if limit is not None:
+            n = min(n, limit)
+        ring = SLOT_HEADER.size + RECORD.size
+        return [unpack_record(data, ring + RECORD.size * (i % self.history_len))
+                for i in range(count - n, count)]
+
+    def close(self):
+        self.shm.close()
+
+
+if __name__ == '__main__':
+    reader = StateReader(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_NAME)
+    try:
+        while True:
+            print(reader.latest())
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
@@ -1,9 +1,22 @@
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, request, jsonify
+from werkzeug.http import http_date
 import serial
 import serial.tools.list_ports
 import threading
 import queue
 import time
+import gzip
+import hashlib
+import json
+import os
+import sys
+import telemetry_binary
+import chamber_shm
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 
@@ -31,6 +44,36 @@ readings = {
 }
 logs = []
 
+# CHAMBER_TELEMETRY=binary asks the firmware for binary frames on connect;
+# firmware without the command keeps sending SENSORS lines, which still parse.
+TELEMETRY_MODE = os.environ.get('CHAMBER_TELEMETRY', 'ascii')
+decoder = None
+
+# Latest readings are mirrored into shared memory for other local processes
+# (see chamber_shm.StateReader). CHAMBER_SHM_SLOT picks this host's chamber.
+state_publisher = None
+SHM_SLOT = int(os.environ.get('CHAMBER_SHM_SLOT', '0'))
+SHM_CHAMBERS = int(os.environ.get('CHAMBER_SHM_CHAMBERS', '1'))
+
+# Bumped whenever the /api/status or /api/logs payload changes, so polling
+# clients can revalidate with If-None-Match and get a 304 instead of a body.
+status_version = 0
+logs_version = 0
+version_lock = threading.Lock()
+
+def bump_status():
+    global status_version
+    with version_lock:
+        status_version += 1
+
+def publish_readings():
+    bump_status()
+    if state_publisher is not None:
+        try:
+            state_publisher.publish(readings, slot=SHM_SLOT)
+        except Exception as e:
+            print(f'[DEBUG] shared memory publish error: {e}')
+
 HTML = '''
 <!DOCTYPE html>
 <html>
@@ -52,7 +95,7 @@ HTML = '''
     </style>
     <script>
         function fetchLogs() {
-            fetch('/api/logs')
+            fetch('/api/logs', { cache: 'no-cache' })
                 .then(r => r.json())
                 .then(data => {
                     const el = document.getElementById('serialLog');
@@ -96,7 +139,7 @@ HTML = '''
         }
         
         function updateStatus() {
-            fetch('/api/status')
+            fetch('/api/status', { cache: 'no-cache' })
                 .then(r => r.json())
                 .then(data => {
                     document.getElementById('status').className = data.connected ? 'connected' : 'disconnected';
@@ -179,37 +222,146 @@ HTML = '''
 </html>
 '''
 
+def handle_line(line):
+    global logs_version
+    print(f'[DEBUG] Received: {line}')
+    # maintain recent logs for web UI
+    try:
+        logs.append(line)
+        if len(logs) > 400:
+            logs.pop(0)
+        with version_lock:
+            logs_version += 1
+    except Exception:
+        pass
+    if line.startswith('SENSORS;'):
+        parts = line.split(';')[1:]
+        for p in parts:
+            if ':' in p:
+                k, v = p.split(':', 1)
+                # Keep the string value as-is (including "NaN")
+                readings[k] = v
+                print(f'[DEBUG] readings[{k}] = {v}')
+        publish_readings()
+
 def serial_reader():
     global ser, connected, readings
     print('[DEBUG] serial_reader thread started')
     while connected and ser:
         try:
-            line = ser.readline().decode('utf-8', errors='ignore').strip()
-            if line:
-                print(f'[DEBUG] Received: {line}')
-                # maintain recent logs for web UI
-                try:
-                    logs.append(line)
-                    if len(logs) > 400:
-                        logs.pop(0)
-                except Exception:
-                    pass
-            if line.startswith('SENSORS;'):
-                parts = line.split(';')[1:]
-                for p in parts:
-                    if ':' in p:
-                        k, v = p.split(':', 1)
-                        # Keep the string value as-is (including "NaN")
-                        readings[k] = v
-                        print(f'[DEBUG] readings[{k}] = {v}')
+            if decoder is not None:
+                # Binary mode: drain whatever arrived and decode it in one go.
+                errors = decoder.crc_errors + decoder.unknown_version
+                lines, frames = decoder.feed(ser.read(ser.in_waiting or 1))
+                for line in lines:
+                    if line:
+                        handle_line(line)
+                if frames:
+                    readings.update(telemetry_binary.frame_to_readings(frames[-1]))
+                    publish_readings()
+                elif decoder.crc_errors + decoder.unknown_version != errors:
+                    # Surface bad frames in /api/status even with no data.
+                    bump_status()
+            else:
+                line = ser.readline().decode('utf-8', errors='ignore').strip()
+                if line:
+                    handle_line(line)
         except Exception as e:
             print(f'[DEBUG] serial_reader error: {e}')
         time.sleep(0.02)
     print('[DEBUG] serial_reader ended')
 
+# The page has no template variables, so encode and compress it once at
+# import instead of re-rendering it on every request.
+PAGE = HTML.encode('utf-8')
+PAGE_GZIP = gzip.compress(PAGE, 9)
+PAGE_BR = brotli.compress(PAGE) if brotli else None
+PAGE_ETAG = hashlib.sha1(PAGE).hexdigest()
+PAGE_LAST_MODIFIED = http_date(time.time())
+
+# Bodies smaller than this are sent uncompressed; the headers would eat the gain.
+MIN_COMPRESS_BYTES = 256
+
+def pick_encoding():
+    """Best encoding the client accepts: 'br', 'gzip' or None."""
+    accepted = request.accept_encodings
+    if brotli and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def encode_body(body, encoding):
+    """Compress body with encoding; return (body, Content-Encoding or None)."""
+    if encoding is None or len(body) < MIN_COMPRESS_BYTES:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=4), 'br'
+    return gzip.compress(body, 5), 'gzip'
+
+# kind -> (version, {accepted encoding: (body, Content-Encoding)}). Each
+# payload is serialized and compressed once per version and encoding, so N
+# dashboards polling after a new serial line cost one compression, not N.
+encoded_cache = {}
+
+# Versions restart at 0 with the process; the token keeps a browser's
+# pre-restart ETag from matching a new payload that reached the same number.
+ETAG_TOKEN = os.urandom(4).hex()
+
+def versioned_json(kind, get_version, build):
+    """JSON response for a versioned payload, with 304 revalidation.
+
+    build() is only called on a cache miss, under version_lock so the serial
+    reader cannot bump the version halfway through.
+    """
+    encoding = pick_encoding()
+    with version_lock:
+        version = get_version()
+        # Each encoding is a different byte stream, so it gets its own ETag.
+        etag = f'{kind}-{ETAG_TOKEN}-{version}' + ('-' + encoding if encoding else '')
+        if etag in request.if_none_match:
+            body = None
+        else:
+            cached_version, bodies = encoded_cache.get(kind, (None, None))
+            if cached_version != version:
+                bodies = {}
+                encoded_cache[kind] = (version, bodies)
+            if encoding not in bodies:
+                if None not in bodies:
+                    raw = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+                    bodies[None] = (raw, None)
+                bodies[encoding] = encode_body(bodies[None][0], encoding)
+            body, content_encoding = bodies[encoding]
+    if body is None:
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype='application/json')
+        if content_encoding:
+            resp.headers['Content-Encoding'] = content_encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.set_etag(etag)
+    return resp
+
 @app.route('/')
 def index():
-    return render_template_string(HTML)
+    accepted = request.accept_encodings
+    if PAGE_BR and accepted['br']:
+        body, encoding = PAGE_BR, 'br'
+    elif accepted['gzip']:
+        body, encoding = PAGE_GZIP, 'gzip'
+    else:
+        body, encoding = PAGE, None
+    # Each encoding is a different byte stream, so it gets its own ETag.
+    etag = PAGE_ETAG + ('-' + encoding if encoding else '')
+    resp = Response(body, mimetype='text/html')
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Last-Modified'] = PAGE_LAST_MODIFIED
+    resp.set_etag(etag)
+    return resp.make_conditional(request)
 
 @app.route('/api/ports')
 def api_ports():
@@ -220,13 +372,19 @@ def api_ports():
 
 @app.route('/api/connect', methods=['POST'])
 def api_connect():
-    global ser, connected
+    global ser, connected, decoder
     data = request.json
     port = data.get('port')
     try:
         ser = serial.Serial(port, 115200, timeout=0.1)
         time.sleep(0.2)
+        if TELEMETRY_MODE == 'binary':
+            decoder = telemetry_binary.FrameDecoder()
+            ser.write(telemetry_binary.CMD_BINARY)
+        else:
+            decoder = None
         connected = True
+        bump_status()
         threading.Thread(target=serial_reader, daemon=True).start()
         return jsonify({'ok': True})
     except Exception as e:
@@ -238,25 +396,30 @@ def api_disconnect():
     connected = False
     try:
         if ser:
+            if decoder is not None:
+                ser.write(telemetry_binary.CMD_ASCII)
             ser.close()
     except Exception:
         pass
     ser = None
+    bump_status()
     return jsonify({'ok': True})
 
 @app.route('/api/status')
 def api_status():
-    return jsonify({
+    return versioned_json('status', lambda: status_version, lambda: {
         'connected': connected,
         'port': ser.port if ser else None,
-        'readings': readings
+        'readings': dict(readings),
+        'telemetry': decoder.stats() if decoder else None
     })
 
 
 @app.route('/api/logs')
 def api_logs():
     # return the last 400 log lines
-    return jsonify({'logs': logs[-400:]})
+    return versioned_json('logs', lambda: logs_version,
+                          lambda: {'logs': logs[-400:]})
 
 @app.route('/api/relay', methods=['POST'])
 def api_relay():
@@ -272,15 +435,42 @@ def api_relay():
             pass
     return jsonify({'ok': True})
 
+def serve_production(host, port):
+    """Serve with waitress; production mode has no dev-server fallback."""
+    threads = int(os.environ.get('CHAMBER_WEB_THREADS', '32'))
+    try:
+        from waitress import serve
+    except ImportError:
+        sys.exit('CHAMBER_WEB_SERVER=production needs waitress: '
+                 'pip install waitress (or unset it to use the dev server)')
+    serve(app, host=host, port=port, threads=threads,
+          connection_limit=int(os.environ.get('CHAMBER_WEB_CONNECTIONS', '1000')),
+          ident='cloudchamber')
+
 if __name__ == '__main__':
     import webbrowser
-    import sys
+    import atexit
     threading.Thread(target=detect_ports, daemon=True).start()
-    port = 8888
+    if chamber_shm.DEFAULT_NAME and not 0 <= SHM_SLOT < SHM_CHAMBERS:
+        print(f'[DEBUG] shared memory disabled: CHAMBER_SHM_SLOT={SHM_SLOT} '
+              f'is outside 0..{SHM_CHAMBERS - 1} (CHAMBER_SHM_CHAMBERS)')
+    elif chamber_shm.DEFAULT_NAME:
+        try:
+            state_publisher = chamber_shm.StatePublisher(chambers=SHM_CHAMBERS)
+            atexit.register(state_publisher.close)
+        except Exception as e:
+            print(f'[DEBUG] shared memory disabled: {e}')
+    port = int(os.environ.get('CHAMBER_WEB_PORT', '8888'))
+    # CHAMBER_WEB_SERVER=production for headless hosts serving many dashboards
+    mode = os.environ.get('CHAMBER_WEB_SERVER', 'dev')
     print(f"Starting server at http://localhost:{port}")
     sys.stdout.flush()
-    try:
-        webbrowser.open(f'http://localhost:{port}')
-    except Exception:
-        pass
-    app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False)
+    if mode == 'production':
+        serve_production('0.0.0.0', port)
+    else:
+        try:
+            webbrowser.open(f'http://localhost:{port}')
+        except Exception:
+            pass
+        app.run(host='0.0.0.0', port=port, debug=False, use_reloader=False,
+                threaded=True)
@@ -79,6 +79,37 @@ enum class TargetField { Inlet, Outlet };
 enum class TextField { WifiSsid, WifiPass, AioUser, AioKey };
 enum class StatusState { Good, Warning, Error };
 enum class TextAlign { Left, Center, Right };
+enum class TelemetryMode { Ascii, Binary };
+
+// Opt-in binary telemetry frame, selected with `TELEMETRY BINARY`. Fields are
+// little-endian (native on the ESP32-S3); the CRC is CRC-16/CCITT-FALSE over
+// every byte between the magic and the CRC itself. Keep in sync with
+// telemetry_binary.py on the host.
+constexpr uint8_t kFrameMagic0 = 0xA5;
+constexpr uint8_t kFrameMagic1 = 0x5A;
+constexpr uint8_t kFrameVersion = 1;
+constexpr uint8_t kFrameFlagRelayHot = 0x01;
+constexpr uint8_t kFrameFlagRelayCold = 0x02;
+constexpr uint8_t kFrameFlagProbeValid = 0x04;
+constexpr uint8_t kFrameFlagAirValid = 0x08;
+
+struct __attribute__((packed)) TelemetryFrame {
+  uint8_t magic[2];
+  uint8_t version;
+  uint8_t flags;
+  uint32_t seq;
+  uint32_t timestampMs;
+  float inletC;
+  float middleC;
+  float outletC;
+  float airC;
+  float humidity;
+  uint16_t lightRaw;
+  uint8_t ds18Count;
+  uint8_t reserved;
+  uint16_t crc;
+};
+static_assert(sizeof(TelemetryFrame) == 38, "TelemetryFrame layout changed");
 
 CrowPanelDisplay display;
 OneWire oneWireBus(BoardConfig::kOneWirePin);
@@ -106,6 +137,8 @@ bool wifiAttemptFailed = false;
 bool firstAioSendDone = false;
 bool lastSendSuccess = false;
 bool serialConnected = false;
+TelemetryMode telemetryMode = TelemetryMode::Ascii;
+uint32_t telemetrySeq = 0;
 
 unsigned long lastReadMs = 0;
 unsigned long lastRelayMs = 0;
@@ -943,6 +976,40 @@ void publishFeeds() {
   uiDirty = true;
 }
 
+uint16_t crc16Ccitt(const uint8_t* data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; ++i) {
+    crc ^= static_cast<uint16_t>(data[i]) << 8;
+    for (int bit = 0; bit < 8; ++bit) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+void writeTelemetryFrame(int deviceCount) {
+  TelemetryFrame frame = {};
+  frame.magic[0] = kFrameMagic0;
+  frame.magic[1] = kFrameMagic1;
+  frame.version = kFrameVersion;
+  frame.flags = (relayHotState ? kFrameFlagRelayHot : 0) |
+                (relayColdState ? kFrameFlagRelayCold : 0) |
+                (sensors.probeValid ? kFrameFlagProbeValid : 0) |
+                (sensors.airValid ? kFrameFlagAirValid : 0);
+  frame.seq = telemetrySeq++;
+  frame.timestampMs = millis();
+  frame.inletC = sensors.inletC;
+  frame.middleC = sensors.middleC;
+  frame.outletC = sensors.outletC;
+  frame.airC = sensors.airC;
+  frame.humidity = sensors.humidity;
+  frame.lightRaw = static_cast<uint16_t>(sensors.lightRaw);
+  frame.ds18Count = static_cast<uint8_t>(deviceCount);
+  const uint8_t* bytes = reinterpret_cast<const uint8_t*>(&frame);
+  frame.crc = crc16Ccitt(bytes + 2, offsetof(TelemetryFrame, crc) - 2);
+  Serial.write(bytes, sizeof(frame));
+}
+
 void updateSensors() {
   if (millis() - lastReadMs < kReadIntervalMs) {
     return;
@@ -976,7 +1043,9 @@ void updateSensors() {
   sensors.lightRaw = analogRead(BoardConfig::kLightPin);
   uiDirty = true;
 
-  if (serialConnected) {
+  if (serialConnected && telemetryMode == TelemetryMode::Binary) {
+    writeTelemetryFrame(deviceCount);
+  } else if (serialConnected) {
     Serial.print("SENSORS;");
     Serial.print("DS18COUNT:");
     Serial.print(deviceCount);
@@ -1033,6 +1102,10 @@ void updateSerialConnection() {
   }
   lastSerialCheckMs = millis();
   serialConnected = static_cast<bool>(Serial);
+  if (!serialConnected) {
+    // Each new host starts in ASCII until it negotiates binary again.
+    telemetryMode = TelemetryMode::Ascii;
+  }
 }
 
 void handleSerialCommand(const String& raw) {
@@ -1053,6 +1126,13 @@ void handleSerialCommand(const String& raw) {
   } else if (cmd.startsWith("TARGET OUTLET ")) {
     settings.outletTargetC = cmd.substring(14).toFloat();
     saveSettings();
+  } else if (cmd == "TELEMETRY BINARY") {
+    // Ack in ASCII so hosts that never see it keep parsing SENSORS lines.
+    Serial.println("TELEMETRY;MODE:BINARY");
+    telemetryMode = TelemetryMode::Binary;
+  } else if (cmd == "TELEMETRY ASCII") {
+    telemetryMode = TelemetryMode::Ascii;
+    Serial.println("TELEMETRY;MODE:ASCII");
   }
   uiDirty = true;
 }
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Decoder for the firmware's opt-in binary telemetry frames.
+
+Send `TELEMETRY BINARY` to switch the firmware over; it acks with
+`TELEMETRY;MODE:BINARY` and then emits fixed 38-byte frames instead of
+`SENSORS;...` lines. Firmware that does not know the command ignores it and
+keeps sending ASCII, so a reader built on FrameDecoder handles both.
+Layout must match TelemetryFrame in src/main.cpp.
+"""
+import binascii
+import struct
+
+MAGIC = b'\xa5\x5a'
+VERSION = 1
+# magic, version, flags, seq, timestamp_ms, hot, mid, cold, air_t, air_h,
+# light, ds18_count, reserved, crc
+FRAME = struct.Struct('<2sBBIIfffffHBBH')
+FRAME_SIZE = FRAME.size
+CRC_END = FRAME_SIZE - 2
+
+FLAG_RELAY_HOT = 0x01
+FLAG_RELAY_COLD = 0x02
+FLAG_PROBE_VALID = 0x04
+FLAG_AIR_VALID = 0x08
+
+CMD_BINARY = b'TELEMETRY BINARY\n'
+CMD_ASCII = b'TELEMETRY ASCII\n'
+
+# Longest run of bytes kept while waiting for a newline in ASCII mode.
+MAX_LINE = 1024
+
+
+def crc16(data):
+    """CRC-16/CCITT-FALSE, matching crc16Ccitt() in the firmware."""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def fmt_float(value):
+    # Same text the ASCII path produces (Serial.print(x, 2) / "NaN")
+    return 'NaN' if value != value else f'{value:.2f}'
+
+
+def frame_to_readings(frame):
+    """Turn a decoded frame tuple into the same dict the SENSORS line gives."""
+    (_, _, flags, _, _, hot, mid, cold, air_t, air_h,
+     light, ds18_count, _, _) = frame
+    return {
+        'DS18COUNT': str(ds18_count),
+        'HOT': fmt_float(hot),
+        'MID': fmt_float(mid),
+        'COLD': fmt_float(cold),
+        'AIR_T': fmt_float(air_t),
+        'AIR_H': fmt_float(air_h),
+        'LIGHT': str(light),
+        'RHOT': 'ON' if flags & FLAG_RELAY_HOT else 'OFF',
+        'RCOLD': 'ON' if flags & FLAG_RELAY_COLD else 'OFF',
+    }
+
+
+class FrameDecoder:
+    """Split a mixed serial byte stream into text lines and binary frames.
+
+    feed() accepts whatever ser.read() returned and gives back
+    (lines, frames): decoded, stripped text lines and raw frame tuples in the
+    FRAME field order. Frames are unpacked straight out of the receive buffer
+    through a memoryview, so a batch costs one struct call and one CRC per
+    frame. Sequence gaps are counted in `dropped`, bad CRCs in `crc_errors`,
+    and valid frames with a layout version this decoder does not know in
+    `unknown_version`.
+    """
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.last_seq = None
+        self.frames = 0
+        self.dropped = 0
+        self.crc_errors = 0
+        self.unknown_version = 0
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'dropped': self.dropped,
+            'crc_errors': self.crc_errors,
+            'unknown_version': self.unknown_version,
+        }
+
+    def feed(self, data):
+        buf = self.buf
+        buf.extend(data)
+        lines = []
+        frames = []
+        pos = 0
+        view = memoryview(buf)
+        try:
+            while pos < len(buf):
+                start = buf.find(MAGIC, pos)
+                text_end = len(buf) if start < 0 else start
+                newline = buf.find(b'\n', pos, text_end)
+                if newline >= 0:
+                    lines.append(bytes(view[pos:newline]))
+                    pos = newline + 1
+                    continue
+                if start < 0:
+                    # Partial text line (or a lone first magic byte); wait.
+                    if len(buf) - pos > MAX_LINE:
+                        lines.append(bytes(view[pos:]))
+                        pos = len(buf)
+                    break
+                if start > pos:
+                    # Text with no newline before a frame: flush it as a line.
+                    lines.append(bytes(view[pos:start]))
+                    pos = start
+                if len(buf) - start < FRAME_SIZE:
+                    break
+                if crc16(view[start + 2:start + CRC_END]) != \
+                        struct.unpack_from('<H', buf, start + CRC_END)[0]:
+                    # Magic bytes by chance, or corruption. A damaged frame is
+                    # at most FRAME_SIZE bytes: resync on a magic inside it,
+                    # else resume right after it so later text still parses.
+                    self.crc_errors += 1
+                    resync = buf.find(MAGIC, start + 1, start + FRAME_SIZE)
+                    pos = resync if resync >= 0 else start + FRAME_SIZE
+                    continue
+                frame = FRAME.unpack_from(buf, start)
+                pos = start + FRAME_SIZE
+                if frame[1] != VERSION:
+                    # Firmware and host disagree on the layout.
+                    self.unknown_version += 1
+                    continue
+                self._track_seq(frame[3])
+                frames.append(frame)
+        finally:
+            view.release()
+        del buf[:pos]
+        return ([l.decode('utf-8', errors='ignore').strip() for l in lines],
+                frames)
+
+    def _track_seq(self, seq):
+        if self.last_seq is not None:
+            gap = (seq - self.last_seq - 1) & 0xFFFFFFFF
+            # A huge gap means the firmware rebooted and restarted at 0.
+            if gap < 0x80000000:
+                self.dropped += gap
+        self.last_seq = seq
+        self.frames += 1